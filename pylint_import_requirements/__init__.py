@@ -10,25 +10,352 @@ Run pylint with
 pylint --load-plugins=pylint_import_requirements <your-files-to-lint>
 ```
 
-The plugin expects a `setup.py` file to exist in the working directory
+The plugin reads the packages and requirements of the project from `setup.py`, `setup.cfg` or
+`pyproject.toml` in the working directory. `setup.py` is only executed if the values cannot be read
+without doing so.
 """
+import ast
+import bisect
+import configparser
+import importlib.machinery
 import importlib.util
-import pathlib
+import itertools
+import os
 import sys
 from collections import namedtuple, defaultdict
-from distutils.core import run_setup # pylint: disable=no-name-in-module,import-error; python3.4 pipeline only
+from functools import lru_cache
 from tokenize import TokenInfo, COMMENT
-from typing import Dict, List, Optional, Set
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 
 import astroid
 import importlib_metadata
-import isort
-from pkg_resources import get_distribution
+from packaging.requirements import Requirement
+from packaging.utils import canonicalize_name
 from pylint.checkers import BaseChecker
-from pylint.interfaces import IAstroidChecker, ITokenChecker
+from pylint.interfaces import IAstroidChecker, IRawChecker, ITokenChecker
 
-_DistInfo = namedtuple("_DistInfo", ("source", "allowed",))
+try:
+    import tomllib  # pylint: disable=import-error; python >= 3.11
+except ImportError:
+    try:
+        import tomli as tomllib  # pylint: disable=import-error; optional
+    except ImportError:
+        tomllib = None
+
+
+class _DistInfo:  # pylint: disable=too-few-public-methods
+    """The distribution a file or module is installed by
+
+    Only the distribution name is stored: accessing `Distribution.metadata` parses METADATA again.
+    `key` is the canonical form of the name, used to compare it with requirements.
+
+    One instance is shared by all files of a distribution. Slots make reading its attributes for
+    every checked import cheaper than with a namedtuple.
+    """
+    __slots__ = ("name", "key", "allowed",)
+
+    def __init__(self, name: str, key: str, allowed: bool):
+        self.name = name
+        self.key = key
+        self.allowed = allowed
+
+
+# A message to add for an import, once the node to report it on is known
+_Message = namedtuple("_Message", ("msgid", "args",))
 _REQUIRES_INSTALL_PREFIX = "pylint-import-requirements:"
+_REQUIRES_INSTALL_PREFIX_LEN = len(_REQUIRES_INSTALL_PREFIX)
+_REQUIRES_INSTALL_PREFIX_BYTES = _REQUIRES_INSTALL_PREFIX.encode("ascii")
+# Only files with these suffixes can be the origin of an imported module
+_MODULE_SUFFIXES = tuple(importlib.machinery.all_suffixes())
+# The same suffixes, in the order the path based finder tries them
+_FINDER_SUFFIXES = tuple(
+    importlib.machinery.EXTENSION_SUFFIXES
+    + importlib.machinery.SOURCE_SUFFIXES
+    + importlib.machinery.BYTECODE_SUFFIXES
+)
+# Top level names of all stdlib modules, available since python 3.10
+_STDLIB_MODULE_NAMES = getattr(sys, "stdlib_module_names", None)
+# Modules compiled into the interpreter are always part of the stdlib
+_BUILTIN_MODULE_NAMES = frozenset(sys.builtin_module_names)
+# isort categories of stdlib modules
+_STDLIB_CATEGORIES = frozenset(("FUTURE", "STDLIB",))
+_DistributionIndex = namedtuple("_DistributionIndex", (
+    "known_files",
+    "known_modules",
+    "allowed_known_modules",
+    "sorted_known_paths",
+    "allowed_names",
+    "dists_without_file_info",
+))
+# Used until linting starts, see `_check_sys_path`
+_EMPTY_DISTRIBUTION_INDEX = _DistributionIndex(
+    known_files={},
+    known_modules={},
+    allowed_known_modules={},
+    sorted_known_paths=[],
+    allowed_names={},
+    dists_without_file_info=frozenset(),
+)
+_SetupInfo = namedtuple("_SetupInfo", ("packages", "install_requires",))
+_SETUP_FILES = ("pyproject.toml", "setup.cfg", "setup.py",)
+# setup.cfg values starting with one of these are resolved by setuptools at runtime
+_SETUP_CFG_DIRECTIVES = ("attr:", "file:", "find:", "find_namespace:",)
+
+
+@lru_cache(maxsize=None)
+def _cached_find_spec(modname: str, package: Optional[str] = None):
+    """Cached version of `importlib.util.find_spec`
+
+    Finding a spec walks the entries of `sys.path`, which is expensive when the same module is
+    imported from many files. The returned specs are only read, so sharing them is safe.
+
+    Returns `None` if the module cannot be found, also when importing a parent package fails or
+    the module was added to `sys.modules` without a spec.
+    """
+    try:
+        return importlib.util.find_spec(modname, package=package)
+    except (ImportError, ValueError):
+        return None
+
+
+def _read_pyproject_toml(path: str) -> Dict[str, List[str]]:
+    """Read the statically declared requirements and packages from a `pyproject.toml` file"""
+    if tomllib is None or not os.path.exists(path):
+        return {}
+
+    with open(path, "rb") as pyproject_file:
+        pyproject = tomllib.load(pyproject_file)
+
+    result = {}
+    # Without a `[project]` table the requirements are declared somewhere else, i.e. `setup.py`
+    project = pyproject.get("project")
+    if isinstance(project, dict) and "dependencies" not in project.get("dynamic", []):
+        result["install_requires"] = project.get("dependencies", [])
+    packages = pyproject.get("tool", {}).get("setuptools", {}).get("packages")
+    if isinstance(packages, list):
+        result["packages"] = packages
+    return result
+
+
+def _read_setup_cfg(path: str) -> Dict[str, List[str]]:
+    """Read the statically declared requirements and packages from a `setup.cfg` file"""
+    parser = configparser.ConfigParser()
+    if not parser.read(path) or not parser.has_section("options"):
+        return {}
+
+    result = {}
+    for key in _SetupInfo._fields:
+        value = parser.get("options", key, fallback="").strip()
+        if not value or value.startswith(_SETUP_CFG_DIRECTIVES):
+            continue
+        # Same format as understood by setuptools: one item per line, or separated by ','
+        items = value.splitlines() if "\n" in value else value.split(",")
+        items = (item.partition("#")[0].strip() for item in items)
+        result[key] = [item for item in items if item]
+    return result
+
+
+def _read_setup_py(path: str) -> Optional[Dict[str, List[str]]]:
+    """Read the literal requirements and packages passed to `setup()`, without executing it
+
+    Returns `None` if there is no `setup()` call, or its arguments are computed at runtime.
+    """
+    with open(path, "rb") as setup_file:
+        try:
+            tree = ast.parse(setup_file.read(), filename=path)
+        except SyntaxError:
+            return None
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func_name = getattr(node.func, "id", None) or getattr(node.func, "attr", None)
+        if func_name != "setup":
+            continue
+
+        # `**kwargs` is stored as keyword without name since python 3.5
+        if getattr(node, "kwargs", None) or any(kw.arg is None for kw in node.keywords):
+            return None
+
+        result = {}
+        for keyword in node.keywords:
+            if keyword.arg not in _SetupInfo._fields:
+                continue
+            try:
+                value = ast.literal_eval(keyword.value)
+                if isinstance(value, str):
+                    # setuptools also accepts a single string, with one item per line
+                    value = (line.partition("#")[0].strip() for line in value.splitlines())
+                    value = [line for line in value if line]
+                result[keyword.arg] = list(value)
+            except (TypeError, ValueError):
+                return None
+        return result
+    return None
+
+
+def _read_setup_info(project_dir: str) -> _SetupInfo:
+    """Find the packages and requirements of the project, preferably without running `setup.py`
+
+    Values declared in `pyproject.toml`, `setup.cfg` and as literal arguments of `setup()` are
+    used in increasing order of precedence. `setup.py` is only executed if the values cannot be
+    determined this way.
+
+    Without a `setup.py`, packages are only known if they are listed explicitly, i.e. in
+    `[tool.setuptools] packages`. Automatic package discovery is not supported then.
+    """
+    values = _read_pyproject_toml(os.path.join(project_dir, "pyproject.toml"))
+    values.update(_read_setup_cfg(os.path.join(project_dir, "setup.cfg")))
+
+    setup_path = os.path.join(project_dir, "setup.py")
+    if os.path.exists(setup_path):
+        setup_kwargs = _read_setup_py(setup_path)
+        if setup_kwargs is not None:
+            values.update(setup_kwargs)
+        if setup_kwargs is None or any(key not in values for key in _SetupInfo._fields):
+            # Packages might be discovered automatically, requirements read from other files, ...
+            # Since python 3.12, `distutils` is only provided by setuptools, importing it first
+            # makes sure its copy is used
+            # pylint: disable=import-outside-toplevel,unused-import
+            import setuptools
+            # pylint: disable=import-outside-toplevel,no-name-in-module,import-error; python3.4 pipeline only
+            from distutils.core import run_setup
+            setup_result = run_setup(setup_path)
+            return _SetupInfo(setup_result.packages or [], setup_result.install_requires or [])
+
+    return _SetupInfo(values.get("packages", []), values.get("install_requires", []))
+
+
+def _get_mtime(path: str) -> Optional[float]:
+    """Return the modification time of the given file, or `None` if it does not exist"""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def _cached_setup_info(project_dir: str, _mtimes: Tuple[Optional[float], ...]) -> _SetupInfo:
+    """Read the setup information only once per process, unless a file was modified meanwhile"""
+    return _read_setup_info(project_dir)
+
+
+def _get_setup_info() -> _SetupInfo:
+    """Get the setup information of the project in the working directory"""
+    project_dir = os.getcwd()
+    mtimes = tuple(_get_mtime(os.path.join(project_dir, name)) for name in _SETUP_FILES)
+    return _cached_setup_info(project_dir, mtimes)
+
+
+@lru_cache(maxsize=None)
+def _cached_distributions(_search_path: Tuple[str, ...]) -> tuple:
+    """Scan for installed distributions only once for every distinct `sys.path`"""
+    return tuple(importlib_metadata.distributions())
+
+
+def _index_module_files(dist, distribution_files, dist_info, known_files) -> bool:
+    """Record the module files of a distribution by their absolute path
+
+    Joining strings to the resolved distribution root once is a lot cheaper than calling `locate()`
+    for every file and produces the same kind of paths as `_resolve_origin`.
+
+    Returns whether the distribution lists the `SOURCES.txt` of its egg metadata, so it does not
+    have to be read. The metadata is either a `*.egg-info` directory or the `EGG-INFO` directory of
+    an installed egg, package data files of the same name do not count.
+    """
+    dist_root = os.path.realpath(str(dist.locate_file("")))
+    has_sources = False
+    for distribution_file in distribution_files:
+        relative_path = str(distribution_file)
+        if relative_path.endswith(_MODULE_SUFFIXES):
+            known_files[os.path.join(dist_root, os.path.normpath(relative_path))] = dist_info
+        elif relative_path.endswith("SOURCES.txt"):
+            metadata_dir, file_name = os.path.split(relative_path)
+            if file_name == "SOURCES.txt" and (
+                    metadata_dir.endswith(".egg-info")
+                    or os.path.basename(metadata_dir) == "EGG-INFO"
+            ):
+                has_sources = True
+    return has_sources
+
+
+@lru_cache(maxsize=1)
+def _build_distribution_index(
+        search_path: Tuple[str, ...], allowed_keys: FrozenSet[str]
+) -> _DistributionIndex:
+    """Record the files and top level modules of all installed distributions
+
+    The result is cached for the last combination of `sys.path` and canonical requirement names,
+    so creating the checker again, i.e. in a long running process, does not scan all
+    distributions again.
+    """
+    known_files = {}  # type: Dict[str, _DistInfo]
+    known_modules = defaultdict(set)  # type: defaultdict[str, Set[_DistInfo]]
+    allowed_names = {}  # type: Dict[str, str]
+    dists_without_file_info = set()  # type: Set[str]
+
+    for dist in _cached_distributions(search_path):
+        dist_name = dist.metadata["Name"]
+        dist_key = canonicalize_name(dist_name or "")
+        allowed = dist_key in allowed_keys
+        if allowed:
+            allowed_names[dist_key] = dist_name
+        dist_info = _DistInfo(dist_name, dist_key, allowed)
+        # Get a list of files created by the distribution
+        distribution_files = dist.files or []
+
+        # Add them to the whitelist
+        has_sources = _index_module_files(dist, distribution_files, dist_info, known_files)
+
+        # Add distributions without files to candidate list for unmatched imports
+        if not distribution_files:
+            dists_without_file_info.add(dist_name)
+
+        # Add source distributions to backup list
+        if not has_sources:
+            continue
+        dist_modules_text = dist.read_text("top_level.txt") or ""
+        for mod in dist_modules_text.split():
+            known_modules[mod].add(dist_info)
+
+    return _DistributionIndex(
+        known_files=known_files,
+        known_modules={mod: tuple(infos) for mod, infos in known_modules.items()},
+        # Checking an import only needs the allowed distributions, unless it is reported
+        allowed_known_modules={
+            mod: tuple(info for info in infos if info.allowed)
+            for mod, infos in known_modules.items()
+            if any(info.allowed for info in infos)
+        },
+        # Sorted paths allow finding all files below a directory by bisecting, see
+        # `_check_namespace_module`
+        sorted_known_paths=sorted(known_files),
+        allowed_names=allowed_names,
+        dists_without_file_info=dists_without_file_info,
+    )
+
+
+def _requirement_names(requirements: List[str]) -> Dict[str, str]:
+    """Map the canonical names of the given requirements to their names as written
+
+    Canonical names are equal for all spellings of a distribution name, i.e. 'Foo_Bar' and 'foo-bar'
+    """
+    result = {}
+    for requirement in requirements:
+        name = Requirement(requirement).name
+        result[canonicalize_name(name)] = name
+    return result
+
+
+@lru_cache(maxsize=1)
+def _get_isort_place_module():
+    """Import isort only when it is needed and return its `place_module` function"""
+    import isort  # pylint: disable=import-outside-toplevel
+
+    if hasattr(isort, "place_module"):  # isort >= v5
+        return isort.place_module  # pylint: disable=no-member
+    sorter = isort.SortImports(file_contents="")  # pylint: disable=no-member
+    return sorter.place_module
 
 
 def _is_namespace_spec(spec) -> bool:
@@ -44,8 +371,16 @@ def _is_namespace_spec(spec) -> bool:
 def _filter_non_namespace_packages(package_names: List[str]) -> List[str]:
     """Given a list of packages, only return those names that are NOT a namespace package"""
     result = []
-    for name in package_names:
-        spec = importlib.util.find_spec(name)
+    confirmed = set()  # type: Set[str]
+    # Parents come first. Subpackages of a package that is not a namespace share its single
+    # search location, so they do not need a spec lookup, which would import the parent.
+    for name in sorted(package_names, key=lambda package_name: package_name.count(".")):
+        if name.rpartition(".")[0] in confirmed:
+            result.append(name)
+            confirmed.add(name)
+            continue
+
+        spec = _cached_find_spec(name)
         if not spec:
             # Could not load module, so its probably not a package
             continue
@@ -55,15 +390,16 @@ def _filter_non_namespace_packages(package_names: List[str]) -> List[str]:
         # The package is directly importable, or a namespace package with only 1
         # search locations, i.e. not really a namespace at all
         result.append(name)
+        confirmed.add(name)
     return result
 
 
-class ImportRequirementsLinter(BaseChecker):
+class ImportRequirementsLinter(BaseChecker):  # pylint: disable=too-many-instance-attributes
     """Check that all import statements are covered by `install_requires` statements"""
 
     # This class variable defines the type of checker that we are implementing.
     # In this case, we are implementing an AST checker.
-    __implements__ = (IAstroidChecker, ITokenChecker,)
+    __implements__ = (IAstroidChecker, IRawChecker, ITokenChecker,)
 
     # The name defines a custom section of the config for this checker.
     name = "import-in-requirements"
@@ -116,69 +452,69 @@ class ImportRequirementsLinter(BaseChecker):
         """Initialize the linter by loading all 'allowed' imports from package requirements"""
         super().__init__(linter)
 
-        self.known_files = {}  # type: Dict[str, _DistInfo]
-        self.known_modules = defaultdict(set)  # type: defaultdict[str, Set[_DistInfo]]
-        if hasattr(isort, "place_module"):  # isort >= v5
-            self._isort_place_module = isort.place_module  # pylint: disable=no-member
+        # Specs depend on `sys.path`, only share them for the lifetime of this checker and only
+        # while `sys.path` does not change, see `_check_sys_path`
+        _cached_find_spec.cache_clear()
+        # Set by `_check_sys_path` once linting starts
+        self._sys_path = None  # type: Optional[List[str]]
+
+        # The category of a module name does not change during a run, so only compute it once
+        self._stdlib_cache = {}  # type: Dict[str, bool]
+        self._first_party_cache = {}  # type: Dict[str, bool]
+        self._resolved_origin_cache = {}  # type: Dict[str, str]
+        self._directory_entries_cache = {}  # type: Dict[str, FrozenSet[str]]
+        # Messages of all imports checked in the current file, see `check_import`
+        self._checked_file = None  # type: Optional[str]
+        self._checked_imports = {}  # type: Dict[tuple, List[_Message]]
+        # Set by `process_module` for every file, before `process_tokens` is called
+        self._file_has_control_comment = True
+
+        setup_result = _get_setup_info()
+        self.first_party_packages = frozenset(
+            _filter_non_namespace_packages(setup_result.packages)
+        )  # type: FrozenSet[str]
+        self._first_party_prefixes = tuple(p + "." for p in self.first_party_packages)
+        # Canonical names of all requirements, mapped to the name used in messages
+        self._requirement_names = _requirement_names(setup_result.install_requires)
+        self.visited_distributions = set()  # type: Set[str]
+        self._load_distribution_index()
+
+    def _load_distribution_index(self):
+        """Look up the distributions installed on the current `sys.path`
+
+        The index is shared with other checkers for the same environment and requirements, it
+        must not be modified.
+        """
+        if self._sys_path is None:
+            index = _EMPTY_DISTRIBUTION_INDEX
         else:
-            sorter = isort.SortImports(file_contents="")  # pylint: disable=no-member
-            self._isort_place_module = sorter.place_module
-        all_loadable_distributions = set(
-            importlib_metadata.distributions()
-        )  # type: Set[Distribution]
-
-        setup_result = run_setup("setup.py")
-        self.first_party_packages = _filter_non_namespace_packages(setup_result.packages or [])
-        self.allowed_distributions = {
-            get_distribution(x).project_name for x in setup_result.install_requires
-        }
-        self.visited_distributions = set()
-        self.dists_without_file_info = set()
-
-        for dist in all_loadable_distributions:
-            dist_name = dist.metadata["Name"]
-            allowed = dist_name in self.allowed_distributions
-            # Get a list of files created by the distribution
-            distribution_files = dist.files or []
-
-            # Resolve the (relative) paths to absolute paths
-            resolved_filepaths = {x.locate() for x in distribution_files}
-
-            # in python3.4 dict.get() always returns None when passing a pathlib.Path as key
-            distribution_file_info = {
-                str(p): _DistInfo(dist, allowed) for p in resolved_filepaths
-            }
-
-            # Add them to the whitelist
-            self.known_files.update(distribution_file_info)
-
-            # Add distributions without files to candidate list for unmatched imports
-            if not distribution_file_info:
-                self.dists_without_file_info.add(dist_name)
-
-            # Add source distributions to backup list
-            if not dist.read_text("SOURCES.txt"):
-                continue
-            dist_modules_text = dist.read_text("top_level.txt") or ""
-            dist_modules = dist_modules_text.split()
-
-            for mod in dist_modules:
-                self.known_modules[mod].add(_DistInfo(dist, allowed))
+            index = _build_distribution_index(
+                tuple(self._sys_path), frozenset(self._requirement_names)
+            )
+        # Requirements are reported by the names of the installed distributions, if possible
+        self.allowed_distributions = dict(self._requirement_names)
+        self.allowed_distributions.update(index.allowed_names)
+        self.known_files = index.known_files
+        self.known_modules = index.known_modules
+        self.allowed_known_modules = index.allowed_known_modules
+        self.sorted_known_paths = index.sorted_known_paths
+        self.dists_without_file_info = index.dists_without_file_info
 
     def visit_import(self, node: astroid.node_classes.Import):
         """Called when an `import foo` statement is visited"""
 
         # Loop, because we get all imports from a single line
         # i.e. `import csv, json -> names=('csv', 'json',)
+        module_file = node.root().file
         for modname, _alias in node.names:
-            self.check_import(node, modname)
+            self.check_import(node, modname, module_file=module_file)
 
     def visit_importfrom(self, node):
         """Called when a `from foo import bar` statement is visited"""
         modname = node.modname
+        root = node.root()
         if node.level:
             # Handle relative imports
-            root = node.root()
             parent_level = node.level
             if root.package:
                 parent_level -= 1
@@ -189,17 +525,75 @@ class ImportRequirementsLinter(BaseChecker):
             return
 
         names = [name for name, _alias in node.names]
-        self.check_import(node, modname, names)
+        self.check_import(node, modname, names, module_file=root.file)
 
     def open(self):
         self.visited_distributions = set()
+        # Cached checks have already marked their distributions as visited, so start over
+        self._checked_file = None
+        self._checked_imports = {}
+        # Do not skip the tokens of a file because of the previous run
+        self._file_has_control_comment = True
+        self._check_sys_path()
 
     def close(self):
-        superfluous_distributions = self.allowed_distributions - self.visited_distributions
+        superfluous_distributions = {
+            name for key, name in self.allowed_distributions.items()
+            if key not in self.visited_distributions
+        }
         for name in sorted(superfluous_distributions):
             self.add_message("unused-requirement", line=0, args=(name,))
 
-    def check_import(self, node, modname: str, names: Optional[List[str]] = None):
+    def check_import(
+            self, node, modname: str, names: Optional[List[str]] = None,
+            module_file: Optional[str] = None,
+    ):
+        """Check an import and add messages for all problems found
+
+        Files often import from the same module several times, i.e. `from foo import bar` and
+        `from foo import baz`. The result of a check does not depend on the node, so it is kept
+        for the rest of the file and reported again for the next node importing the same names.
+
+        `module_file` is the file of the module containing `node`. Visitors pass it in, so it is
+        not looked up again for every name of a statement.
+        """
+        if self._sys_path is None:
+            # Visited without `open()`
+            self._check_sys_path()
+        if module_file is None:
+            module_file = node.root().file
+        if module_file != self._checked_file:
+            self._checked_file = module_file
+            self._checked_imports = {}
+
+        key = (modname, tuple(names) if names else None)
+        try:
+            messages = self._checked_imports[key]
+        except KeyError:
+            messages = self._checked_imports[key] = self._check_module(modname, names)
+
+        for message in messages:
+            self.add_message(message.msgid, node=node, args=message.args)
+
+    def _check_sys_path(self):
+        """Drop all cached results that depend on `sys.path` if it changed since the last check
+
+        Long running processes may lint several projects, or modify `sys.path` in between. This
+        also loads the distribution index in the first place: pylint adds the directories of the
+        linted files to `sys.path` after creating the checkers, but before calling `open()`.
+        """
+        if sys.path == self._sys_path:
+            return
+        self._sys_path = list(sys.path)
+        _cached_find_spec.cache_clear()
+        self._resolved_origin_cache.clear()
+        self._directory_entries_cache.clear()
+        self._checked_imports = {}
+        self._load_distribution_index()
+
+    def _check_module(  # pylint: disable=too-many-return-statements
+            self, modname: str, names: Optional[List[str]]
+    ) -> List[_Message]:
         """Run the actual check
 
         It works like this:
@@ -219,85 +613,149 @@ class ImportRequirementsLinter(BaseChecker):
         """
         # Step 1
         if self._is_first_party_module(modname):
-            return
+            return []
 
         # Step 2
         if self._is_stdlib_module(modname):
-            return
+            return []
 
         # Step 3
-        spec = importlib.util.find_spec(modname, package=node.frame().name)
+        # Relative imports never reach this point, so `find_spec` does not need a package to
+        # resolve `modname` against. Leaving it out lets imports from different files share the
+        # cached result.
+        spec = _cached_find_spec(modname)
         if not spec:
-            return
+            return []
 
         # Step 4
-        if spec.origin is None and (
+        # `find_spec` leaves the loader of namespace packages unset since python 3.11, and the
+        # loader of imported ones was renamed to `NamespaceLoader`
+        if spec.origin is None and spec.loader is not None and (
             spec.loader.__module__ != "_frozen_importlib_external"
-            or type(spec.loader).__name__ not in ("SourceFileLoader", "_NamespaceLoader")
+            or type(spec.loader).__name__ not in (
+                "SourceFileLoader", "_NamespaceLoader", "NamespaceLoader"
+            )
         ):
-            return
+            return []
 
         # Step 5
         if _is_namespace_spec(spec):
             # Must be namespace package
-            self.check_namespace_module(node, spec, names)
-            return
+            return self._check_namespace_module(spec, names)
 
         # Step 6
-        resolved_origin = pathlib.Path(spec.origin).resolve()
-        known_info = self.known_files.get(str(resolved_origin))
+        resolved_origin = self._resolve_origin(spec.origin)
+        known_info = self.known_files.get(resolved_origin)
+        # Only allowed distributions can be reported as unused, so only those are marked visited
         if known_info:
-            self.visited_distributions.add(known_info.source.metadata["Name"])
-
-        if known_info and not known_info.allowed:
-            candidate_name = known_info.source.metadata["Name"]
-            self.add_message("missing-requirement", node=node, args=(modname, candidate_name))
-        if not known_info:
-            mod_candidates = self._from_known_mod(modname) or set()
-
-            allowed_candidate = None
-            for mod in mod_candidates:
-                self.visited_distributions.add(mod.source.metadata["Name"])
-                if mod.allowed:
-                    allowed_candidate = mod
-            if allowed_candidate:
-                return
-
-            dist_names = [x.source.metadata['Name'] for x in mod_candidates]
-            self._warn_no_requirement(node, modname, dist_names)
-
-    def check_namespace_module(self, node, spec, names: Optional[List[str]]):
+            if known_info.allowed:
+                self.visited_distributions.add(known_info.key)
+                return []
+            return [_Message("missing-requirement", (modname, known_info.name))]
+
+        toplevel, _, _ = modname.partition(".")
+        allowed_candidates = self.allowed_known_modules.get(toplevel)
+        if allowed_candidates:
+            self.visited_distributions.update(mod.key for mod in allowed_candidates)
+            return []
+
+        dist_names = [x.name for x in self._from_known_mod(modname)]
+        return [self._no_requirement_message(modname, dist_names)]
+
+    def _check_namespace_module(self, spec, names: Optional[List[str]]) -> List[_Message]:
         """Try to check a module spec of a namespace module"""
         # If we import any names, try to resolve them instead
         if names:
+            messages = []
             for name in names:
-                self.check_import(node, modname="{}.{}".format(spec.name, name), names=None)
-            return
+                # Submodules installed by an allowed distribution are fine, no matter what else
+                # the checks below would find. Everything else needs the full check.
+                submodule_file = self._find_submodule_file(spec, name)
+                if submodule_file is not None:
+                    info = self.known_files.get(self._resolve_origin(submodule_file))
+                    if info and info.allowed:
+                        self.visited_distributions.add(info.key)
+                        continue
+
+                messages.extend(
+                    self._check_module(modname="{}.{}".format(spec.name, name), names=None)
+                )
+            return messages
 
         # We tried our best, but we can only verify that some part of the namespace is installed
-        submodule_path = str(next(iter(spec.submodule_search_locations)))
         other_candidates = set()
-        for path, info in self.known_files.items():
-            if not path.startswith(submodule_path):
-                continue
+        for location in spec.submodule_search_locations:
+            # The trailing separator prevents matching files of `foobar` when looking for `foo`
+            submodule_prefix = self._resolve_origin(str(location)).rstrip(os.sep) + os.sep
+            # All paths starting with the prefix are sorted right after where it would be inserted
+            start = bisect.bisect_left(self.sorted_known_paths, submodule_prefix)
+            for path in itertools.islice(self.sorted_known_paths, start, None):
+                if not path.startswith(submodule_prefix):
+                    break
+
+                info = self.known_files[path]
+                if info.allowed:
+                    return []
 
-            if info.allowed:
-                return
+                other_candidates.add(info.name)
 
-            other_candidates.add(info.source.metadata["Name"])
+        return [self._no_requirement_message(spec.name, other_candidates)]
 
-        self._warn_no_requirement(node, spec.name, other_candidates)
+    def _find_submodule_file(self, spec, name: str) -> Optional[str]:
+        """Find the file a submodule of a namespace package would be loaded from
 
-    def _warn_no_requirement(self, node, modname, candidates):
+        This only looks at the directory listings of the namespace, so it is much cheaper than
+        `find_spec`. Returns `None` if the submodule is not a plain module or regular package.
+        """
+        for location in spec.submodule_search_locations:
+            entries = self._directory_entries(location)
+            if name in entries:
+                package_dir = os.path.join(location, name)
+                init_entries = self._directory_entries(package_dir)
+                for suffix in _FINDER_SUFFIXES:
+                    if "__init__" + suffix in init_entries:
+                        return os.path.join(package_dir, "__init__" + suffix)
+                # A portion of a nested namespace package, leave that to `find_spec`
+                return None
+
+            for suffix in _FINDER_SUFFIXES:
+                if name + suffix in entries:
+                    return os.path.join(location, name + suffix)
+
+        return None
+
+    def _directory_entries(self, path: str) -> FrozenSet[str]:
+        """List the names in a directory, or nothing if it cannot be read"""
+        try:
+            return self._directory_entries_cache[path]
+        except KeyError:
+            pass
+        try:
+            entries = frozenset(os.listdir(path))
+        except OSError:
+            entries = frozenset()
+        self._directory_entries_cache[path] = entries
+        return entries
+
+    def _no_requirement_message(self, modname, candidates) -> _Message:
         """warn that modname is not in requirements"""
         if candidates:
             candidates_fmt = ", ".join(sorted(candidates))
-            self.add_message("missing-requirement", node=node, args=(modname, candidates_fmt))
-        else:
-            candidates_fmt = ", ".join(sorted(self.dists_without_file_info))
-            self.add_message("unknown-requirement", node=node, args=(modname, candidates_fmt))
-
-    def _from_known_mod(self, modname: str) -> Optional[Set[_DistInfo]]:
+            return _Message("missing-requirement", (modname, candidates_fmt))
+        candidates_fmt = ", ".join(sorted(self.dists_without_file_info))
+        return _Message("unknown-requirement", (modname, candidates_fmt))
+
+    def _resolve_origin(self, origin: str) -> str:
+        """Resolve a path from a module spec to an absolute path without symlinks"""
+        try:
+            return self._resolved_origin_cache[origin]
+        except KeyError:
+            pass
+        resolved_origin = os.path.realpath(origin)
+        self._resolved_origin_cache[origin] = resolved_origin
+        return resolved_origin
+
+    def _from_known_mod(self, modname: str) -> Tuple[_DistInfo, ...]:
         """Resolve the modname based on all modnames provided by distributions
 
         This can be useful in case a loaded file is for some reason or another not listed in the
@@ -308,13 +766,29 @@ class ImportRequirementsLinter(BaseChecker):
         build extension
         """
         toplevel, _, _ = modname.partition(".")
-        return self.known_modules.get(toplevel)
+        return self.known_modules.get(toplevel, ())
+
+    @staticmethod
+    def _isort_place_module(module_name: str) -> str:
+        """Get the category isort places the module in, i.e. 'STDLIB' or 'THIRDPARTY'"""
+        return _get_isort_place_module()(module_name)
 
     def _is_stdlib_module(self, module_name: str) -> bool:
         """Check if the given path is from a built-in module or not"""
+        if _STDLIB_MODULE_NAMES is not None:
+            return module_name.partition(".")[0] in _STDLIB_MODULE_NAMES
+
+        try:
+            return self._stdlib_cache[module_name]
+        except KeyError:
+            pass
         # Approach taken from https://github.com/PyCQA/pylint/blob/master/pylint/checkers/imports.py
-        import_category = self._isort_place_module(module_name)
-        return import_category in {"FUTURE", "STDLIB"}
+        is_stdlib = (
+            module_name in _BUILTIN_MODULE_NAMES
+            or self._isort_place_module(module_name) in _STDLIB_CATEGORIES
+        )
+        self._stdlib_cache[module_name] = is_stdlib
+        return is_stdlib
 
     def _is_first_party_module(self, module) -> bool:
         """Check if the given module is from a first party package
@@ -332,13 +806,28 @@ class ImportRequirementsLinter(BaseChecker):
 
         Because of this, there is a 2 stage lookup:
         1. if the module name matches one of the known first party names, it is a first party module
-        2. split the name at the last '.'. If everything before the last '.' is in the first party
-           names, it is also accepted as first party module
+        2. if the module name starts with one of the known first party names followed by a '.', it
+           is also accepted as first party module. This includes modules in nested packages that
+           are not listed themselves.
         """
-        if module in self.first_party_packages:
-            return True
-        package_name = module.rpartition(".")[0]  # rpartition always returns 3 items
-        return package_name in self.first_party_packages
+        try:
+            return self._first_party_cache[module]
+        except KeyError:
+            pass
+        is_first_party = (
+            module in self.first_party_packages or module.startswith(self._first_party_prefixes)
+        )
+        self._first_party_cache[module] = is_first_party
+        return is_first_party
+
+    def process_module(self, node):
+        """Called with the raw module before its tokens are processed
+
+        Only a few files contain control comments. Searching the source for the prefix is a lot
+        cheaper than looking at all tokens in `process_tokens`.
+        """
+        with node.stream() as stream:
+            self._file_has_control_comment = _REQUIRES_INSTALL_PREFIX_BYTES in stream.read()
 
     def process_tokens(self, tokens: List[TokenInfo]):
         """Scan tokens to respond to control comments.
@@ -350,15 +839,19 @@ class ImportRequirementsLinter(BaseChecker):
         pd.read_feather('file.feather')  # pylint-import-requirements: imports=pyarrow
         ```
         """
+        if not self._file_has_control_comment:
+            return
+
         for token in tokens:
-            if token.type != COMMENT:
+            # Most comments are no control comments, skip them before allocating new strings
+            if token.type != COMMENT or _REQUIRES_INSTALL_PREFIX not in token.string:
                 continue
 
             content = token.string.lstrip("# ")
             if not content.startswith(_REQUIRES_INSTALL_PREFIX):
                 continue
 
-            stripped_content = content[len(_REQUIRES_INSTALL_PREFIX):].strip()
+            stripped_content = content[_REQUIRES_INSTALL_PREFIX_LEN:].strip()
             option_name, _, option_values = stripped_content.partition("=")
 
             if option_name != "imports":
@@ -368,7 +861,7 @@ class ImportRequirementsLinter(BaseChecker):
                 continue
 
             for val in option_values.split(","):
-                self.visited_distributions.add(val)
+                self.visited_distributions.add(canonicalize_name(val))
 
 
 def register(linter):
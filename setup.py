@@ -20,6 +20,7 @@ setup(
         "pylint",
         "astroid",
         "importlib-metadata",
+        "packaging",
         "setuptools",
         "isort",
     ],
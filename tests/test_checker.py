@@ -1,8 +1,8 @@
 import contextlib
-import copy
+import functools
 import importlib.abc
 import importlib.machinery
-import os
+import io
 import pathlib
 import shutil
 import sys
@@ -14,138 +14,231 @@ import astroid
 import pylint.testutils
 import pytest
 
+import pylint_import_requirements
 from pylint_import_requirements import ImportRequirementsLinter
 
+# The checker only reads the nodes, so every test using the same code can share them
+extract_node = functools.lru_cache(maxsize=None)(astroid.extract_node)
+
+
+@functools.lru_cache(maxsize=None)
+def _tokenize_lines(lines: typing.Tuple[bytes, ...]) -> typing.Tuple[tokenize.TokenInfo, ...]:
+    return tuple(tokenize.tokenize(io.BytesIO(b'\n'.join(lines)).readline))
+
+
+def tokenize_lines(lines: typing.List[bytes]) -> typing.Tuple[tokenize.TokenInfo, ...]:
+    """Tokenize source lines, only once for every distinct source"""
+    return _tokenize_lines(tuple(lines))
+
 
 @contextlib.contextmanager
-def expect_messages(expected_messages: typing.List[pylint.testutils.Message]) \
+def expect_messages(expected_messages: typing.List[pylint.testutils.Message],
+                    checker: typing.Optional[ImportRequirementsLinter] = None) \
         -> typing.Iterator[ImportRequirementsLinter]:
-    linter = pylint.testutils.UnittestLinter()
-    yield ImportRequirementsLinter(linter)
-    issued_messages = linter.release_messages()
+    if checker is None:
+        checker = ImportRequirementsLinter(pylint.testutils.UnittestLinter())
+    yield checker
+    issued_messages = checker.linter.release_messages()
     assert issued_messages == expected_messages
 
 
+def use_project_dir(monkeypatch, project_dir):
+    monkeypatch.chdir(project_dir.strpath)
+    monkeypatch.syspath_prepend(project_dir.strpath)
+
+
+MOCK_PROJECTS = {
+    'uppercase': {
+        'setup.py': (
+            "import setuptools\n"
+            "setuptools.setup(\n"
+            "   packages=['_test_module'],\n"
+            "   install_requires=['astroid', 'pylint', 'UppercaSe'],\n"
+            ")\n"
+        ),
+        '_test_module.py': (
+            "def hello():\n"
+            "   pass\n"
+        ),
+    },
+    'namespace': {
+        'setup.py': (
+            "import setuptools\n"
+            "setuptools.setup(\n"
+            "   packages=['name', 'name.foo'],\n"
+            "   install_requires=['astroid', 'pylint', 'namespace'],\n"
+            ")\n"
+        ),
+        'name/foo/__init__.py': (
+            "def hello():\n"
+            "   pass\n"
+        ),
+    },
+}
+
+
+# The projects are only written once per module. Since their paths do not change, the checkers
+# of all tests share the cached setup info and distribution index.
+@pytest.fixture(scope='module')
+def project_dirs(tmpdir_factory):
+    dirs = {}
+    for project_name, files in MOCK_PROJECTS.items():
+        project_dir = dirs[project_name] = tmpdir_factory.mktemp(project_name + '_project')
+        for file_name, content in files.items():
+            project_dir.join(file_name).ensure().write_text(content, encoding='utf-8')
+    return dirs
+
+
 @pytest.fixture()
-def mock_only_uppercase(tmpdir) -> typing.Iterator[None]:
-    tmpdir.join('setup.py').write_text(
-        "import setuptools\n"
-        "setuptools.setup(\n"
-        "   packages=['_test_module'],\n"
-        "   install_requires=['astroid', 'pylint', 'UppercaSe'],\n"
-        ")\n",
-        encoding='utf-8',
-    )
-    tmpdir.join('_test_module.py').write_text(
-        "def hello():\n"
-        "   pass\n",
-        encoding='utf-8',
-    )
-    old_cwd = os.getcwd()
-    os.chdir(tmpdir.strpath)
-    old_path = copy.copy(sys.path)
-    sys.path.insert(0, tmpdir.strpath)
-    try:
-        yield
-    finally:
-        os.chdir(old_cwd)
-        sys.path = old_path
+def mock_project(request, monkeypatch, project_dirs) -> str:
+    """Work in one of the `MOCK_PROJECTS`, chosen by indirect parametrization"""
+    project_name = getattr(request, 'param', 'uppercase')
+    use_project_dir(monkeypatch, project_dirs[project_name])
+    return project_name
 
 
 @pytest.fixture()
-def custom_site_path(tmpdir):
-    this_dir = pathlib.Path(__file__).parent
-    old_path = copy.copy(sys.path)
-    shutil.copytree(
-        str(this_dir.joinpath("test-site-path")),
-        tmpdir.join("site-packages").strpath
-    )
-    sys.path.insert(0, tmpdir.join("site-packages").strpath)
-    try:
-        yield
-    finally:
-        sys.path = old_path
+def mock_only_uppercase(monkeypatch, project_dirs):
+    use_project_dir(monkeypatch, project_dirs['uppercase'])
 
 
 @pytest.fixture()
-def mock_only_namespace(tmpdir) -> typing.Iterator[None]:
-    tmpdir.join('setup.py').write_text(
-        "import setuptools\n"
-        "setuptools.setup(\n"
-        "   packages=['name', 'name.foo'],\n"
-        "   install_requires=['astroid', 'pylint', 'namespace'],\n"
-        ")\n",
-        encoding='utf-8',
-    )
-    namespace_dir = tmpdir.join("name", "foo")
-    namespace_dir.ensure(dir=True)
-    namespace_dir.join('__init__.py').write_text(
-        "def hello():\n"
-        "   pass\n",
-        encoding='utf-8',
-    )
-    old_cwd = os.getcwd()
-    os.chdir(tmpdir.strpath)
-    old_path = copy.copy(sys.path)
-    sys.path.insert(0, tmpdir.strpath)
+def mock_only_namespace(monkeypatch, project_dirs):
+    use_project_dir(monkeypatch, project_dirs['namespace'])
+
+
+@pytest.fixture(scope='module')
+def project_checkers() -> typing.Dict[str, ImportRequirementsLinter]:
+    return {}
+
+
+@pytest.fixture()
+def shared_checker(mock_project, project_checkers) -> ImportRequirementsLinter:
+    """A checker for the mock project, only reset in between tests"""
     try:
-        yield
-    finally:
-        os.chdir(old_cwd)
-        sys.path = old_path
-
-
-@pytest.mark.parametrize('code', [
-    'import astroid',
-    'import pylint',
-    'import astroid as hypocycloid',
-    'import pylint.testutils',
-    'import _test_module',
-    'import uppercase',
-])
-def test_clean_import(mock_only_uppercase, code):
-    import_node = astroid.extract_node(code)
-    with expect_messages([]) as checker:
-        checker.visit_import(import_node)
+        checker = project_checkers[mock_project]
+    except KeyError:
+        checker = ImportRequirementsLinter(pylint.testutils.UnittestLinter())
+        project_checkers[mock_project] = checker
+    checker.linter.release_messages()
+    checker.open()
+    return checker
 
 
-@pytest.mark.parametrize('code', [
-    'import astroid',
-    'import pylint',
-    'import astroid as hypocycloid',
-    'import pylint.testutils',
-    'import name.foo',
-])
-def test_clean_import_ns(mock_only_namespace, code):
-    import_node = astroid.extract_node(code)
-    with expect_messages([]) as checker:
+@pytest.fixture(scope='module')
+def site_path_dir(tmpdir_factory):
+    this_dir = pathlib.Path(__file__).parent
+    site_dir = tmpdir_factory.mktemp('site_path').join('site-packages')
+    shutil.copytree(str(this_dir.joinpath("test-site-path")), site_dir.strpath)
+    return site_dir
+
+
+@pytest.fixture()
+def custom_site_path(monkeypatch, site_path_dir):
+    monkeypatch.syspath_prepend(site_path_dir.strpath)
+
+
+@pytest.mark.parametrize(('mock_project', 'code'), [
+    (project, code)
+    for project in MOCK_PROJECTS
+    for code in (
+        'import astroid',
+        'import pylint',
+        'import astroid as hypocycloid',
+        'import pylint.testutils',
+    )
+] + [
+    ('uppercase', 'import _test_module'),
+    ('uppercase', 'import uppercase'),
+    ('uppercase', 'import _missing_package.module'),
+    ('namespace', 'import name.foo'),
+], indirect=['mock_project'])
+def test_clean_import(shared_checker, code):
+    import_node = extract_node(code)
+    with expect_messages([], shared_checker) as checker:
         checker.visit_import(import_node)
 
 
-@pytest.mark.parametrize('code', [
-    'from astroid import extract_node',
-    'from astroid import extract_node as astroid_extract_node',
-    'from pylint.testutils import Message, UnittestLinter',
-    'from _test_module import hello',
-    'from uppercase import bla',
-])
-def test_clean_importfrom(mock_only_uppercase, code):
-    importfrom_node = astroid.extract_node(code)
-    with expect_messages([]) as checker:
+@pytest.mark.parametrize(('mock_project', 'code'), [
+    (project, code)
+    for project in MOCK_PROJECTS
+    for code in (
+        'from astroid import extract_node',
+        'from astroid import extract_node as astroid_extract_node',
+        'from pylint.testutils import Message, UnittestLinter',
+        'from _test_module import hello',
+    )
+] + [
+    ('uppercase', 'from uppercase import bla'),
+    ('namespace', 'from name import foo'),
+], indirect=['mock_project'])
+def test_clean_importfrom(shared_checker, code):
+    importfrom_node = extract_node(code)
+    with expect_messages([], shared_checker) as checker:
         checker.visit_importfrom(importfrom_node)
 
 
-@pytest.mark.parametrize('code', [
-    'from astroid import extract_node',
-    'from astroid import extract_node as astroid_extract_node',
-    'from pylint.testutils import Message, UnittestLinter',
-    'from _test_module import hello',
-    'from name import foo',
+def test_namespace_spec_without_loader(mock_only_uppercase):
+    # Specs of namespace packages look like this since python 3.11
+    spec = importlib.machinery.ModuleSpec('_loaderless_ns', None, is_package=True)
+    spec.submodule_search_locations = list(
+        pylint_import_requirements._cached_find_spec('name').submodule_search_locations
+    )
+    import_node = extract_node('import _loaderless_ns')
+    expected_msg = pylint.testutils.Message(
+        msg_id='missing-requirement',
+        args=('_loaderless_ns', 'namespace'),
+        node=import_node,
+    )
+    with expect_messages([expected_msg]) as checker:
+        with unittest.mock.patch.object(pylint_import_requirements, '_cached_find_spec',
+                                        return_value=spec):
+            checker.visit_import(import_node)
+
+
+def test_importfrom_ns_submodules_from_listing(tmpdir, monkeypatch):
+    tmpdir.join('setup.py').write_text(
+        "import setuptools\n"
+        "setuptools.setup(install_requires=['namespace'])\n",
+        encoding='utf-8',
+    )
+    monkeypatch.chdir(tmpdir.strpath)
+    checker = ImportRequirementsLinter(pylint.testutils.UnittestLinter())
+    checker.open()
+    spec = pylint_import_requirements._cached_find_spec('name')
+    with unittest.mock.patch.object(
+            checker, '_check_module', wraps=checker._check_module
+    ) as check_module:
+        messages = checker._check_namespace_module(spec, ['space', 'missing'])
+    assert messages == []
+    # `name.space` is installed by an allowed distribution, no need to look up its spec
+    check_module.assert_called_once_with(modname='name.missing', names=None)
+
+
+@pytest.mark.parametrize(('module', 'is_first_party'), [
+    ('_test_module', True),
+    ('_test_module.foo', True),
+    ('_test_module.foo.bar', True),
+    ('_test_module_foo', False),
+    ('astroid', False),
 ])
-def test_clean_importfrom_ns(mock_only_namespace, code):
-    importfrom_node = astroid.extract_node(code)
+def test_first_party_module(mock_only_uppercase, module, is_first_party):
+    checker = ImportRequirementsLinter(pylint.testutils.UnittestLinter())
+    assert checker._is_first_party_module(module) == is_first_party
+
+
+def test_requirement_name_canonicalized(tmpdir, monkeypatch):
+    tmpdir.join('setup.py').write_text(
+        "import setuptools\n"
+        "setuptools.setup(\n"
+        "   packages=[],\n"
+        "   install_requires=['ASTROID>=2.0', 'Importlib.Metadata'],\n"
+        ")\n",
+        encoding='utf-8',
+    )
+    monkeypatch.chdir(tmpdir.strpath)
     with expect_messages([]) as checker:
-        checker.visit_importfrom(importfrom_node)
+        run_checker(checker, ['import astroid', 'import importlib_metadata'])
 
 
 class _ModuleLoader:
@@ -163,13 +256,28 @@ class _MetaPathFinder(importlib.abc.MetaPathFinder):
 
 @pytest.mark.parametrize("code", ["import custom", "from custom import foo"])
 def test_skip_custom_loader(mock_only_uppercase, code):
-    import_node = astroid.extract_node(code)
+    import_node = extract_node(code)
     with unittest.mock.patch("sys.meta_path",
                              new=[_MetaPathFinder] + sys.meta_path):
         with expect_messages([]) as checker:
             checker.visit_import(import_node)
 
 
+def test_sys_path_change_reloads_distributions(mock_only_uppercase, monkeypatch,
+                                               site_path_dir):
+    import_node = extract_node('import foo')
+    expected_msg = pylint.testutils.Message(
+        msg_id='unknown-requirement',
+        args=('foo', 'bar, foo'),
+        node=import_node,
+    )
+    with expect_messages([expected_msg]) as checker:
+        checker.open()
+        monkeypatch.syspath_prepend(site_path_dir.strpath)
+        checker.open()
+        checker.visit_import(import_node)
+
+
 @pytest.mark.parametrize(('code', 'expected_msg_args'), [
     ('import setuptools', ('setuptools', 'setuptools')),
     ('import importlib_metadata', ('importlib_metadata', 'importlib-metadata')),
@@ -178,18 +286,55 @@ def test_skip_custom_loader(mock_only_uppercase, code):
     ('import name', ('name', 'namespace')),
     ('import name.space', ('name.space', 'namespace')),
 ])
-def test_missing_requirement_import(mock_only_uppercase, code,
+def test_missing_requirement_import(shared_checker, code,
                                     expected_msg_args):
-    import_node = astroid.extract_node(code)
+    import_node = extract_node(code)
     expected_msg = pylint.testutils.Message(
         msg_id='missing-requirement',
         args=expected_msg_args,
         node=import_node,
     )
-    with expect_messages([expected_msg]) as checker:
+    with expect_messages([expected_msg], shared_checker) as checker:
         checker.visit_import(import_node)
 
 
+def test_repeated_import_reported_per_node(mock_only_uppercase):
+    first_node, second_node = extract_node(
+        'import setuptools #@\n'
+        'import setuptools #@\n'
+    )
+    expected_msgs = [
+        pylint.testutils.Message(
+            msg_id='missing-requirement',
+            args=('setuptools', 'setuptools'),
+            node=node,
+        ) for node in (first_node, second_node)
+    ]
+    with expect_messages(expected_msgs) as checker:
+        with unittest.mock.patch.object(
+                checker, '_check_module', wraps=checker._check_module
+        ) as check_module:
+            checker.visit_import(first_node)
+            checker.visit_import(second_node)
+        check_module.assert_called_once_with('setuptools', None)
+
+
+def test_sys_path_change_invalidates_caches(mock_only_uppercase, monkeypatch, tmpdir):
+    late_dir = tmpdir.mkdir('late')
+    late_dir.join('_late_module.py').write_text('', encoding='utf-8')
+    import_node = extract_node('import _late_module')
+    linter = pylint.testutils.UnittestLinter()
+    checker = ImportRequirementsLinter(linter)
+
+    checker.visit_import(import_node)
+    assert linter.release_messages() == []
+
+    monkeypatch.syspath_prepend(late_dir.strpath)
+    checker.open()
+    checker.visit_import(import_node)
+    assert [msg.msg_id for msg in linter.release_messages()] == ['unknown-requirement']
+
+
 @pytest.mark.parametrize(('code', 'expected_msg_args'), [
     ('import setuptools', ('setuptools', 'setuptools')),
     ('import importlib_metadata', ('importlib_metadata', 'importlib-metadata')),
@@ -197,15 +342,16 @@ def test_missing_requirement_import(mock_only_uppercase, code,
     ('import setuptools.monkey as simian', ('setuptools.monkey', 'setuptools')),
     ('import uppercase', ('uppercase', 'UppercaSe')),
 ])
-def test_missing_requirement_import_ns(mock_only_namespace, code,
+@pytest.mark.parametrize('mock_project', ['namespace'], indirect=True)
+def test_missing_requirement_import_ns(shared_checker, code,
                                        expected_msg_args):
-    import_node = astroid.extract_node(code)
+    import_node = extract_node(code)
     expected_msg = pylint.testutils.Message(
         msg_id='missing-requirement',
         args=expected_msg_args,
         node=import_node,
     )
-    with expect_messages([expected_msg]) as checker:
+    with expect_messages([expected_msg], shared_checker) as checker:
         checker.visit_import(import_node)
 
 
@@ -221,15 +367,15 @@ def test_missing_requirement_import_ns(mock_only_namespace, code,
     ('from name import space', ('name.space', 'namespace')),
     ('from name.space import hello_world', ('name.space', 'namespace')),
 ])
-def test_missing_requirement_importfrom(mock_only_uppercase, code,
+def test_missing_requirement_importfrom(shared_checker, code,
                                         expected_msg_args):
-    importfrom_node = astroid.extract_node(code)
+    importfrom_node = extract_node(code)
     expected_msg = pylint.testutils.Message(
         msg_id='missing-requirement',
         args=expected_msg_args,
         node=importfrom_node,
     )
-    with expect_messages([expected_msg]) as checker:
+    with expect_messages([expected_msg], shared_checker) as checker:
         checker.visit_importfrom(importfrom_node)
 
 
@@ -244,15 +390,16 @@ def test_missing_requirement_importfrom(mock_only_uppercase, code,
      ('setuptools.monkey', 'setuptools')),
     ('from uppercase import bla', ('uppercase', 'UppercaSe')),
 ])
-def test_missing_requirement_importfrom_ns(mock_only_namespace, code,
+@pytest.mark.parametrize('mock_project', ['namespace'], indirect=True)
+def test_missing_requirement_importfrom_ns(shared_checker, code,
                                            expected_msg_args):
-    importfrom_node = astroid.extract_node(code)
+    importfrom_node = extract_node(code)
     expected_msg = pylint.testutils.Message(
         msg_id='missing-requirement',
         args=expected_msg_args,
         node=importfrom_node,
     )
-    with expect_messages([expected_msg]) as checker:
+    with expect_messages([expected_msg], shared_checker) as checker:
         checker.visit_importfrom(importfrom_node)
 
 
@@ -289,7 +436,7 @@ def test_missing_requirement_importfrom_ns(mock_only_namespace, code,
             ]
     ),
 ])
-def test_unused_requirements(mock_only_uppercase, codelines,
+def test_unused_requirements(shared_checker, codelines,
                              expected_msgs_args):
     expected_msgs = []
     for msg_args in expected_msgs_args:
@@ -298,7 +445,7 @@ def test_unused_requirements(mock_only_uppercase, codelines,
             args=msg_args,
             line=0,
         ))
-    with expect_messages(expected_msgs) as checker:
+    with expect_messages(expected_msgs, shared_checker) as checker:
         run_checker(checker, codelines)
 
 
@@ -335,7 +482,7 @@ def test_unused_requirements(mock_only_uppercase, codelines,
             ]
     ),
 ])
-def test_comment_control(mock_only_uppercase, comments, expected_msgs_args):
+def test_comment_control(shared_checker, comments, expected_msgs_args):
     expected_msgs = []
     for msg_args in expected_msgs_args:
         expected_msgs.append(pylint.testutils.Message(
@@ -343,9 +490,9 @@ def test_comment_control(mock_only_uppercase, comments, expected_msgs_args):
             args=msg_args,
             line=0,
         ))
-    with expect_messages(expected_msgs) as checker:
+    with expect_messages(expected_msgs, shared_checker) as checker:
         checker.open()
-        checker.process_tokens(tokenize.tokenize(iter(comments).__next__))
+        checker.process_tokens(tokenize_lines(comments))
         checker.close()
 
 
@@ -401,7 +548,8 @@ def test_comment_control(mock_only_uppercase, comments, expected_msgs_args):
             ]
     ),
 ])
-def test_unused_requirements_ns(mock_only_namespace, codelines,
+@pytest.mark.parametrize('mock_project', ['namespace'], indirect=True)
+def test_unused_requirements_ns(shared_checker, codelines,
                                 expected_msgs_args):
     expected_msgs = []
     for msg_args in expected_msgs_args:
@@ -410,7 +558,7 @@ def test_unused_requirements_ns(mock_only_namespace, codelines,
             args=msg_args,
             line=0,
         ))
-    with expect_messages(expected_msgs) as checker:
+    with expect_messages(expected_msgs, shared_checker) as checker:
         run_checker(checker, codelines)
 
 
@@ -499,13 +647,63 @@ def test_unused_requirements_ns(mock_only_namespace, codelines,
             ],
     ),
 ])
-def test_comment_control_parsing(mock_only_uppercase, comments, expected_msgs):
-    with expect_messages(expected_msgs) as checker:
+def test_comment_control_parsing(shared_checker, comments, expected_msgs):
+    with expect_messages(expected_msgs, shared_checker) as checker:
         checker.open()
-        checker.process_tokens(tokenize.tokenize(iter(comments).__next__))
+        checker.process_tokens(tokenize_lines(comments))
         checker.close()
 
 
+@pytest.mark.parametrize(('source', 'has_control_comment', 'expected_msgs_args'), [
+    (
+        'import os\n'
+        '# pylint-import-requirements: imports=astroid,pylint,UppercaSe\n',
+        True,
+        [],
+    ),
+    (
+        'import os\n'
+        '# imports=astroid,pylint,UppercaSe\n',
+        False,
+        [('UppercaSe',), ('astroid',), ('pylint',)],
+    ),
+    # Only a candidate for the prefilter, the tokens show it is not a comment
+    (
+        'PREFIX = "pylint-import-requirements: imports=astroid,pylint,UppercaSe"\n',
+        True,
+        [('UppercaSe',), ('astroid',), ('pylint',)],
+    ),
+], ids=['control-comment', 'plain-comment', 'prefix-in-string'])
+def test_comment_control_raw_prefilter(shared_checker, source, has_control_comment,
+                                       expected_msgs_args):
+    module_node = astroid.parse(source)
+    expected_msgs = [
+        pylint.testutils.Message(msg_id='unused-requirement', args=msg_args, line=0)
+        for msg_args in expected_msgs_args
+    ]
+    with expect_messages(expected_msgs, shared_checker) as checker:
+        checker.open()
+        checker.process_module(module_node)
+        assert checker._file_has_control_comment is has_control_comment
+        with module_node.stream() as stream:
+            checker.process_tokens(list(tokenize.tokenize(stream.readline)))
+        checker.close()
+
+
+def test_comment_control_prefilter_reset_by_open(mock_only_uppercase):
+    linter = pylint.testutils.UnittestLinter()
+    checker = ImportRequirementsLinter(linter)
+    checker.open()
+    checker.process_module(astroid.parse('# imports=astroid,pylint,UppercaSe\n'))
+    checker.close()
+    linter.release_messages()
+
+    # Tokens without a `process_module` call, as in `test_comment_control_parsing`
+    checker.open()
+    checker.process_tokens(tokenize_lines([b'# pylint-import-requirements: imports_test_module']))
+    assert [msg.msg_id for msg in linter.release_messages()] == ['unrecognized-inline-option']
+
+
 @pytest.mark.parametrize(('code', 'expected_msg_args'), [
     (
             'import foo',
@@ -523,7 +721,7 @@ def test_comment_control_parsing(mock_only_uppercase, comments, expected_msgs):
 def test_missing_dist_meta_files_import(custom_site_path, mock_only_namespace,
                                         code,
                                         expected_msg_args):
-    import_node = astroid.extract_node(code)
+    import_node = extract_node(code)
     expected_msg = pylint.testutils.Message(
         msg_id='unknown-requirement',
         args=expected_msg_args,
@@ -546,7 +744,7 @@ def test_missing_dist_meta_files_import(custom_site_path, mock_only_namespace,
 def test_missing_dist_meta_files_importfrom(custom_site_path,
                                             mock_only_namespace, code,
                                             expected_msg_args):
-    import_node = astroid.extract_node(code)
+    import_node = extract_node(code)
     expected_msg = pylint.testutils.Message(
         msg_id='unknown-requirement',
         args=expected_msg_args,
@@ -556,11 +754,178 @@ def test_missing_dist_meta_files_importfrom(custom_site_path,
         checker.visit_importfrom(import_node)
 
 
+def test_filter_non_namespace_subpackages(tmpdir, monkeypatch):
+    tmpdir.join('_filter_pkg', 'sub', '__init__.py').ensure()
+    tmpdir.join('_filter_pkg', '__init__.py').ensure()
+    monkeypatch.syspath_prepend(tmpdir.strpath)
+    with unittest.mock.patch.object(
+            pylint_import_requirements, '_cached_find_spec',
+            wraps=pylint_import_requirements._cached_find_spec
+    ) as find_spec:
+        packages = pylint_import_requirements._filter_non_namespace_packages(
+            ['_filter_pkg.sub', '_filter_pkg']
+        )
+    assert packages == ['_filter_pkg', '_filter_pkg.sub']
+    find_spec.assert_called_once_with('_filter_pkg')
+
+
+def test_distribution_index_source_distributions(tmpdir, monkeypatch):
+    # A source distribution with egg metadata ...
+    tmpdir.join('sdist.egg-info', 'PKG-INFO').ensure().write_text(
+        'Metadata-Version: 1.0\nName: sdist\nVersion: 1.0\n', encoding='utf-8')
+    tmpdir.join('sdist.egg-info', 'SOURCES.txt').write_text(
+        'sdist/__init__.py\nsdist.egg-info/SOURCES.txt\nsdist.egg-info/top_level.txt\n',
+        encoding='utf-8')
+    tmpdir.join('sdist.egg-info', 'top_level.txt').write_text('sdist\n', encoding='utf-8')
+    # ... and a wheel shipping a data file called SOURCES.txt
+    tmpdir.join('_datawheel-1.0.dist-info', 'METADATA').ensure().write_text(
+        'Metadata-Version: 2.1\nName: _datawheel\nVersion: 1.0\n', encoding='utf-8')
+    tmpdir.join('_datawheel-1.0.dist-info', 'RECORD').write_text(
+        '_datawheel/__init__.py,,\n'
+        '_datawheel/data/SOURCES.txt,,\n'
+        '_datawheel-1.0.dist-info/top_level.txt,,\n',
+        encoding='utf-8')
+    tmpdir.join('_datawheel-1.0.dist-info', 'top_level.txt').write_text(
+        '_datawheel\n', encoding='utf-8')
+    # ... and an installed egg, with its metadata in `EGG-INFO`
+    egg_dir = tmpdir.join('_eggpkg-1.0.egg')
+    egg_dir.join('EGG-INFO', 'PKG-INFO').ensure().write_text(
+        'Metadata-Version: 1.0\nName: _eggpkg\nVersion: 1.0\n', encoding='utf-8')
+    egg_dir.join('EGG-INFO', 'SOURCES.txt').write_text(
+        '_eggpkg/__init__.py\nEGG-INFO/SOURCES.txt\nEGG-INFO/top_level.txt\n',
+        encoding='utf-8')
+    egg_dir.join('EGG-INFO', 'top_level.txt').write_text('_eggpkg\n', encoding='utf-8')
+    # Files that do not exist are not listed by importlib_metadata
+    for file_name in ('sdist/__init__.py', '_datawheel/__init__.py',
+                      '_datawheel/data/SOURCES.txt', '_eggpkg-1.0.egg/_eggpkg/__init__.py'):
+        tmpdir.join(file_name).ensure()
+    monkeypatch.syspath_prepend(tmpdir.strpath)
+    monkeypatch.syspath_prepend(egg_dir.strpath)
+
+    index = pylint_import_requirements._build_distribution_index(tuple(sys.path), frozenset())
+    assert 'sdist' in index.known_modules
+    assert '_eggpkg' in index.known_modules
+    assert '_datawheel' not in index.known_modules
+
+
+def test_distribution_index_shared(mock_only_uppercase):
+    first = ImportRequirementsLinter(pylint.testutils.UnittestLinter())
+    second = ImportRequirementsLinter(pylint.testutils.UnittestLinter())
+    first.open()
+    second.open()
+    assert first.known_files is second.known_files
+    assert first.allowed_distributions == second.allowed_distributions
+
+
+def test_literal_setup_not_executed(mock_only_uppercase):
+    with unittest.mock.patch("distutils.core.run_setup") as run_setup:
+        checker = ImportRequirementsLinter(pylint.testutils.UnittestLinter())
+    run_setup.assert_not_called()
+    assert checker.first_party_packages == {'_test_module'}
+
+
+@pytest.mark.parametrize('setup_py', [
+    "import setuptools\n"
+    "setuptools.setup(packages=setuptools.find_packages())\n",
+    "import setuptools\n"
+    "setuptools.setup(**{'packages': []})\n",
+    "import setuptools\n"
+    "setuptools.setup(packages=[], install_requires=REQUIREMENTS)\n",
+])
+def test_dynamic_setup_executed_once(tmpdir, monkeypatch, setup_py):
+    tmpdir.join('setup.py').write_text(setup_py, encoding='utf-8')
+    monkeypatch.chdir(tmpdir.strpath)
+    with unittest.mock.patch("distutils.core.run_setup") as run_setup:
+        pylint_import_requirements._cached_setup_info(tmpdir.strpath, ())
+        pylint_import_requirements._cached_setup_info(tmpdir.strpath, ())
+    run_setup.assert_called_once_with(tmpdir.join('setup.py').strpath)
+
+
+@pytest.mark.parametrize(('setup_args', 'expected_setup_values'), [
+    ("install_requires='astroid >= 2.0\\npylint # comment\\n'",
+     {'install_requires': ['astroid >= 2.0', 'pylint']}),
+    ("packages=['foo'], install_requires=('astroid',)",
+     {'packages': ['foo'], 'install_requires': ['astroid']}),
+    ("install_requires=None", None),
+    ("install_requires=1", None),
+])
+def test_read_setup_py(tmpdir, setup_args, expected_setup_values):
+    tmpdir.join('setup.py').write_text(
+        "import setuptools\n"
+        "setuptools.setup({})\n".format(setup_args),
+        encoding='utf-8',
+    )
+    setup_values = pylint_import_requirements._read_setup_py(tmpdir.join('setup.py').strpath)
+    assert setup_values == expected_setup_values
+
+
+def test_setup_cfg(tmpdir):
+    tmpdir.join('setup.py').write_text(
+        "import setuptools\n"
+        "setuptools.setup()\n",
+        encoding='utf-8',
+    )
+    tmpdir.join('setup.cfg').write_text(
+        "[options]\n"
+        "packages = foo, foo.bar\n"
+        "install_requires =\n"
+        "    astroid\n"
+        "    # comment\n"
+        "    pylint >= 2.0 # minimum version\n",
+        encoding='utf-8',
+    )
+    with unittest.mock.patch("distutils.core.run_setup") as run_setup:
+        setup_info = pylint_import_requirements._read_setup_info(tmpdir.strpath)
+    run_setup.assert_not_called()
+    assert setup_info.packages == ['foo', 'foo.bar']
+    assert setup_info.install_requires == ['astroid', 'pylint >= 2.0']
+
+
+@pytest.mark.skipif(pylint_import_requirements.tomllib is None,
+                    reason="requires tomllib or tomli")
+def test_pyproject_toml(tmpdir):
+    tmpdir.join('pyproject.toml').write_text(
+        "[project]\n"
+        "dependencies = ['astroid', 'pylint']\n"
+        "[tool.setuptools]\n"
+        "packages = ['foo']\n",
+        encoding='utf-8',
+    )
+    setup_info = pylint_import_requirements._read_setup_info(tmpdir.strpath)
+    assert setup_info.packages == ['foo']
+    assert setup_info.install_requires == ['astroid', 'pylint']
+
+
+@pytest.mark.skipif(pylint_import_requirements.tomllib is None,
+                    reason="requires tomllib or tomli")
+@pytest.mark.parametrize('pyproject_toml', [
+    "[build-system]\n"
+    "requires = ['setuptools']\n",
+    "[project]\n"
+    "name = 'foo'\n"
+    "dynamic = ['dependencies']\n",
+], ids=['build-system-only', 'dynamic-dependencies'])
+def test_pyproject_toml_without_dependencies(tmpdir, pyproject_toml):
+    tmpdir.join('pyproject.toml').write_text(pyproject_toml, encoding='utf-8')
+    # The requirements are computed by `setup.py`, i.e. read from a requirements file
+    tmpdir.join('setup.py').write_text(
+        "import setuptools\n"
+        "setuptools.setup(packages=['foo'])\n",
+        encoding='utf-8',
+    )
+    with unittest.mock.patch("distutils.core.run_setup") as run_setup:
+        run_setup.return_value.packages = ['foo']
+        run_setup.return_value.install_requires = ['astroid']
+        setup_info = pylint_import_requirements._read_setup_info(tmpdir.strpath)
+    run_setup.assert_called_once_with(tmpdir.join('setup.py').strpath)
+    assert setup_info.install_requires == ['astroid']
+
+
 def run_checker(checker, lines):
     """run the linter on import statements"""
     checker.open()
     for line in lines:
-        node = astroid.extract_node(line)
+        node = extract_node(line)
         if isinstance(node, astroid.Import):
             checker.visit_import(node)
         else:
@@ -1,3 +1,5 @@
+import unittest.mock
+
 import pylint.testutils
 import pytest
 
@@ -37,3 +39,26 @@ def test__isort_place_module(checker, module_name, category):
 )
 def test__is_stdlib_module(checker, module_name, is_stdlib_module):
     assert checker._is_stdlib_module(module_name) == is_stdlib_module
+
+
+@pytest.mark.parametrize(
+    "module_name", ["__future__", "astroid", "io", "os.path", "pylint_import_requirements"]
+)
+def test__is_stdlib_module_matches_isort(checker, module_name):
+    with unittest.mock.patch.object(pylint_import_requirements, "_STDLIB_MODULE_NAMES", None):
+        from_isort = checker._is_stdlib_module(module_name)
+    assert checker._is_stdlib_module(module_name) == from_isort
+
+
+def test__is_stdlib_module_cached():
+    checker = pylint_import_requirements.ImportRequirementsLinter(
+        linter=pylint.testutils.UnittestLinter()
+    )
+    with unittest.mock.patch.object(
+        pylint_import_requirements, "_STDLIB_MODULE_NAMES", None
+    ), unittest.mock.patch.object(
+        checker, "_isort_place_module", wraps=checker._isort_place_module
+    ) as place_module:
+        assert checker._is_stdlib_module("io")
+        assert checker._is_stdlib_module("io")
+    place_module.assert_called_once_with("io")